@@ -0,0 +1,48 @@
+import subprocess
+import wave
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WaveFileSource:
+    def __init__(self, path):
+        self.path = path
+        self.wave_file = wave.open(path, 'rb')
+        self.sample_rate = self.wave_file.getframerate()
+        self.channels = self.wave_file.getnchannels()
+        self.sample_width = self.wave_file.getsampwidth()
+        logger.debug(f"Opened audio file {path} ({self.sample_rate} Hz, {self.channels} ch)")
+
+    def read(self, frames):
+        # Returns b"" once the file is exhausted
+        return self.wave_file.readframes(frames)
+
+    def close(self):
+        self.wave_file.close()
+
+class AlsaSource:
+    def __init__(self, device, sample_rate=8000, channels=1):
+        self.device = device
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = 2
+        self.process = subprocess.Popen(
+            ["arecord", "-q", "-D", device, "-t", "raw", "-f", "S16_LE", "-r", str(sample_rate), "-c", str(channels)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        logger.debug(f"Opened ALSA capture device {device} ({sample_rate} Hz, {channels} ch)")
+
+    def read(self, frames):
+        return self.process.stdout.read(frames * self.channels * self.sample_width)
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+
+def open_audio_input(device, sample_rate=8000):
+    # A .wav path stands in for the handset microphone, which keeps recording and decoding testable off the Pi
+    if device.endswith('.wav'):
+        return WaveFileSource(device)
+    return AlsaSource(device, sample_rate)
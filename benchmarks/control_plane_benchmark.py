@@ -0,0 +1,556 @@
+import argparse
+import bisect
+import copy
+import difflib
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Event, Thread
+
+import yaml
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+FAKES_DIR = os.path.join(BENCHMARKS_DIR, 'fakes')
+
+# The fakes shadow RPi.GPIO and pygame, everything else (paho, ha-mqtt-discoverable) is real
+sys.path.insert(0, FAKES_DIR)
+sys.path.insert(1, REPO_DIR)
+
+import RPi.GPIO as GPIO
+from pygame import mixer
+import phone_controller
+from phone_controller import PhoneController
+from fake_broker import FakeBroker
+import dtmf_benchmark
+import voicemail_benchmark
+
+logger = logging.getLogger("benchmark")
+
+with open(os.path.join(REPO_DIR, 'config.yaml'), 'r') as config_file:
+    BASE_CONFIG = yaml.safe_load(config_file)
+
+with open(os.path.join(REPO_DIR, 'entities.yaml'), 'r') as entities_file:
+    ENTITIES = yaml.safe_load(entities_file)
+
+def benchmark_config(work_dir, **overrides):
+    config = copy.deepcopy(BASE_CONFIG)
+    config.update(
+        call_log_path=os.path.join(work_dir, 'call_log.db'),
+        voicemail_dir=os.path.join(work_dir, 'voicemail'),
+        watchdog_diagnostics_path=os.path.join(work_dir, 'watchdog.log'),
+        enable_voicemail=False,
+        enable_dtmf=False,
+    )
+    config.update(overrides)
+    return config
+
+def fake_sounds():
+    return {name: mixer.Sound(name) for name in ("dial_tone", "busy_signal", "ringback")}
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    def rank(percentile):
+        return ordered[min(len(ordered) - 1, max(0, -(-len(ordered) * percentile // 100) - 1))]
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": rank(50) * 1000,
+        "p95_ms": rank(95) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+class Timeline:
+    # Level of one pin over time, built from (time, level) transitions
+    def __init__(self, initial):
+        self.times = [float('-inf')]
+        self.levels = [initial]
+
+    def set(self, at, level):
+        self.times.append(at)
+        self.levels.append(level)
+
+    def level_at(self, at):
+        return self.levels[bisect.bisect_right(self.times, at) - 1]
+
+def rotary_pulses(timeline, start, digit, pulses_per_second, jitter, rng):
+    # Pulse contacts break (LOW) for ~60% and make (HIGH) for ~40% of each pulse period
+    period = 1 / pulses_per_second
+    at = start
+    for _ in range(10 if digit == 0 else digit):
+        break_time = period * 0.6 * (1 + rng.uniform(-jitter, jitter))
+        make_time = period * 0.4 * (1 + rng.uniform(-jitter, jitter))
+        timeline.set(at, GPIO.LOW)
+        timeline.set(at + break_time, GPIO.HIGH)
+        at += break_time + make_time
+    return at
+
+class VirtualClock:
+    # Replaces the time module inside phone_controller so pulse decoding runs faster than
+    # real time. Every sleep overshoots a little, like a scheduler on a busy Pi would.
+    def __init__(self, rng, overshoot=(0.0002, 0.002)):
+        self.now = 1000.0
+        self.rng = rng
+        self.overshoot = overshoot
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds + self.rng.uniform(*self.overshoot)
+
+class DigitCapture(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.digits = []
+
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith("Dialed digit: "):
+            self.digits.append(message[len("Dialed digit: "):])
+
+def bench_pulse_accuracy(work_dir, trials, seed, digits_per_number=5):
+    rng = random.Random(seed)
+    config = benchmark_config(work_dir)
+    GPIO.reset()
+    controller = PhoneController(config, fake_sounds(), None)
+    capture = DigitCapture()
+    controller_logger = logging.getLogger(phone_controller.__name__)
+    previous_level = controller_logger.level
+    controller_logger.addHandler(capture)
+    controller_logger.setLevel(logging.DEBUG)
+    controller_logger.propagate = False
+    real_time = phone_controller.time
+    results = []
+    try:
+        for pulses_per_second in (8, 10, 12):
+            for jitter in (0.0, 0.1, 0.2):
+                numbers_correct = digits_correct = digits_total = 0
+                for _ in range(trials):
+                    clock = VirtualClock(rng)
+                    phone_controller.time = clock
+                    number = [rng.randrange(10) for _ in range(digits_per_number)]
+                    hook = Timeline(GPIO.LOW)
+                    pulse = Timeline(GPIO.HIGH)
+                    at = clock.now + rng.uniform(0.05, 0.3)
+                    for digit in number:
+                        at = rotary_pulses(pulse, at, digit, pulses_per_second, jitter, rng)
+                        at += rng.uniform(0.5, 0.9)  # Winding the dial for the next digit
+                    hook.set(at + 0.5, GPIO.HIGH)
+                    GPIO.set_input_source(config['hook_switch_pin'], lambda: hook.level_at(clock.now))
+                    GPIO.set_input_source(config['pulse_pin'], lambda: pulse.level_at(clock.now))
+
+                    capture.digits = []
+                    controller.dialed_number = ""
+                    controller.count_pulses()
+
+                    expected = [str(digit) for digit in number]
+                    matcher = difflib.SequenceMatcher(None, expected, capture.digits, autojunk=False)
+                    digits_correct += sum(block.size for block in matcher.get_matching_blocks())
+                    digits_total += len(expected)
+                    numbers_correct += capture.digits == expected
+                results.append({
+                    "pulses_per_second": pulses_per_second,
+                    "jitter": jitter,
+                    "numbers": trials,
+                    "number_accuracy": numbers_correct / trials,
+                    "digit_accuracy": digits_correct / digits_total,
+                })
+                logger.info(f"Pulse decode {pulses_per_second} pps, jitter {jitter:.0%}: "
+                            f"{numbers_correct / trials:.0%} numbers, {digits_correct / digits_total:.0%} digits")
+    finally:
+        phone_controller.time = real_time
+        controller_logger.removeHandler(capture)
+        controller_logger.setLevel(previous_level)
+        controller_logger.propagate = True
+        GPIO.reset()
+    return results
+
+def wait_for(condition, timeout, interval=0.001):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if (result := condition()):
+            return result
+        time.sleep(interval)
+    return None
+
+def first_play_after(name, since):
+    with mixer.events_lock:
+        for at, sound_name, action in mixer.events:
+            if at >= since and sound_name == name and action == "play":
+                return at
+    return None
+
+def measure_hook_to_tone(controller, config, trials, rng):
+    latencies = []
+    for _ in range(trials):
+        off_hook_at = time.monotonic()
+        GPIO.set_input(config['hook_switch_pin'], GPIO.LOW)
+        played_at = wait_for(lambda: first_play_after("dial_tone", off_hook_at), timeout=2)
+        if played_at is not None:
+            latencies.append(played_at - off_hook_at)
+        time.sleep(rng.uniform(0.05, 0.15))
+        GPIO.set_input(config['hook_switch_pin'], GPIO.HIGH)
+        wait_for(lambda: controller.on_hook, timeout=2)
+        time.sleep(rng.uniform(0.0, 0.1))
+    return latencies
+
+def start_workers(controller):
+    threads = [Thread(target=controller.handle_hook_switch_and_dial, daemon=True),
+               Thread(target=controller.check_dial_timeout, daemon=True)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def stop_workers(controller, threads):
+    controller.stop_event.set()
+    for thread in threads:
+        thread.join(timeout=2)
+
+def bench_call_flow(work_dir, trials, seed, dial_timeout=0.5):
+    rng = random.Random(seed)
+    config = benchmark_config(work_dir, dial_timeout=dial_timeout)
+    GPIO.reset()
+    mixer.clear_events()
+    controller = PhoneController(config, fake_sounds(), None)
+    controller.dial_timeout = dial_timeout
+
+    handled = []
+    handle_dialed_number = controller.handle_dialed_number
+    def record_dialed_number(number):
+        handled.append((time.monotonic(), number))
+        handle_dialed_number(number)
+    controller.handle_dialed_number = record_dialed_number
+
+    threads = start_workers(controller)
+    hook_to_tone = measure_hook_to_tone(controller, config, trials, rng)
+
+    # Latency only counts numbers that decoded correctly; misdecoded ones are reported apart
+    digit_to_action = []
+    misdecoded_to_action = []
+    decoded = 0
+    for _ in range(trials):
+        GPIO.set_input(config['hook_switch_pin'], GPIO.LOW)
+        wait_for(lambda: not controller.on_hook, timeout=2)
+        digit = rng.randrange(1, 10)
+        pulse = Timeline(GPIO.HIGH)
+        dial_state = Timeline(GPIO.LOW)
+        # Off-normal contacts close while the dial is being wound, well before the first pulse
+        start = time.monotonic() + 0.5
+        dial_state.set(start - 0.3, GPIO.HIGH)
+        last_pulse_end = rotary_pulses(pulse, start, digit, 10, 0.0, rng)
+        dial_state.set(last_pulse_end, GPIO.LOW)
+        GPIO.set_input_source(config['pulse_pin'], lambda: pulse.level_at(time.monotonic()))
+        GPIO.set_input_source(config['dial_state_pin'], lambda: dial_state.level_at(time.monotonic()))
+        handled.clear()
+        result = wait_for(lambda: handled[0] if handled else None, timeout=last_pulse_end - time.monotonic() + dial_timeout + 3)
+        if result is not None:
+            handled_at, number = result
+            if number == str(digit):
+                decoded += 1
+                digit_to_action.append(handled_at - last_pulse_end)
+            else:
+                misdecoded_to_action.append(handled_at - last_pulse_end)
+        GPIO.set_input(config['hook_switch_pin'], GPIO.HIGH)
+        wait_for(lambda: controller.on_hook, timeout=2)
+        GPIO.set_input(config['pulse_pin'], GPIO.HIGH)
+        GPIO.set_input(config['dial_state_pin'], GPIO.LOW)
+        time.sleep(rng.uniform(0.0, 0.1))
+
+    # Same dial timeout and handle_dialed_number path, fed through add_dtmf_digit so decoding can't miss
+    keyed_to_action = []
+    for _ in range(trials):
+        GPIO.set_input(config['hook_switch_pin'], GPIO.LOW)
+        wait_for(lambda: not controller.on_hook, timeout=2)
+        digit = str(rng.randrange(10))
+        handled.clear()
+        keyed_at = time.monotonic()
+        controller.add_dtmf_digit(digit)
+        result = wait_for(lambda: handled[0] if handled else None, timeout=dial_timeout + 3)
+        if result is not None and result[1] == digit:
+            keyed_to_action.append(result[0] - keyed_at)
+        GPIO.set_input(config['hook_switch_pin'], GPIO.HIGH)
+        wait_for(lambda: controller.on_hook, timeout=2)
+        time.sleep(rng.uniform(0.0, 0.1))
+
+    stop_workers(controller, threads)
+    GPIO.reset()
+    action = percentiles(digit_to_action)
+    keyed_action = percentiles(keyed_to_action)
+    result = {
+        "hook_to_tone": percentiles(hook_to_tone),
+        "digit_to_action": action,
+        "misdecoded_to_action": percentiles(misdecoded_to_action),
+        "keyed_digit_to_action": keyed_action,
+        "dial_timeout_ms": dial_timeout * 1000,
+        "real_time_digit_accuracy": decoded / trials,
+    }
+    if action["count"]:
+        result["digit_to_action_overhead_p50_ms"] = action["p50_ms"] - dial_timeout * 1000
+    if keyed_action["count"]:
+        result["keyed_digit_to_action_overhead_p50_ms"] = keyed_action["p50_ms"] - dial_timeout * 1000
+    logger.info(f"Hook to tone p50 {result['hook_to_tone'].get('p50_ms', 0):.1f}ms, "
+                f"digit to action p50 {action.get('p50_ms', 0):.1f}ms over {action['count']} correctly decoded numbers "
+                f"({len(misdecoded_to_action)} misdecoded), keyed digit to action p50 {keyed_action.get('p50_ms', 0):.1f}ms "
+                f"over {keyed_action['count']}, with a {dial_timeout * 1000:.0f}ms dial timeout")
+    return result
+
+def bench_ring_storm(work_dir, seconds, storm_threads, seed):
+    import paho.mqtt.client as mqtt
+    from home_assistant_client import HomeAssistantClient
+
+    rng = random.Random(seed)
+    broker = FakeBroker().start()
+    config = benchmark_config(work_dir, retain=False)
+    GPIO.reset()
+    mixer.clear_events()
+
+    discovery_start = time.monotonic()
+    ha_client = HomeAssistantClient(
+        broker=broker.host, port=broker.port, username="benchmark", password="benchmark",
+        token="", api_url="", config=config, entities=ENTITIES, phone_controller=None
+    )
+    discovery_seconds = time.monotonic() - discovery_start
+    controller = PhoneController(config, fake_sounds(), ha_client)
+    ha_client.phone_controller = controller
+    state_topic = ha_client.ringer_output_entity.state_topic
+    start_topic = ha_client.start_ring_entity._command_topic
+    stop_topic = ha_client.stop_ring_entity._command_topic
+
+    # The button callbacks look the method up on the controller, so these only note when each
+    # press reaches the phone; ringing itself runs unchanged
+    ring_starts = []
+    start_ringing = controller.start_ringing
+    def timed_start_ringing():
+        ring_starts.append(time.monotonic())
+        start_ringing()
+    controller.start_ringing = timed_start_ringing
+    state_updates = [0]
+    update_state = ha_client.ringer_output_entity.update_state
+    def counted_update_state(state):
+        state_updates[0] += 1
+        update_state(state)
+    ha_client.ringer_output_entity.update_state = counted_update_state
+
+    threads = start_workers(controller)
+    time.sleep(0.5)
+    broker.reset_counts()
+
+    # Several HA clients pressing Start Ring and Stop Ring on the buttons' command topics
+    storm_stop = Event()
+    pressers = []
+    for index in range(storm_threads):
+        client = mqtt.Client(client_id=f"storm-{index}")
+        client.connect(broker.host, broker.port)
+        client.loop_start()
+        pressers.append(client)
+    def storm(client, presser_rng):
+        while not storm_stop.is_set():
+            client.publish(start_topic, "PRESS")
+            time.sleep(presser_rng.uniform(0.05, 0.3))
+            client.publish(stop_topic, "PRESS")
+            time.sleep(presser_rng.uniform(0.05, 0.3))
+    storm_workers = [Thread(target=storm, args=(client, random.Random(rng.random())), daemon=True) for client in pressers]
+    storm_start = time.monotonic()
+    for worker in storm_workers:
+        worker.start()
+
+    hook_to_tone = []
+    while time.monotonic() - storm_start < seconds:
+        hook_to_tone += measure_hook_to_tone(controller, config, 1, rng)
+    storm_stop.set()
+    for worker in storm_workers:
+        worker.join()
+    storm_seconds = time.monotonic() - storm_start
+
+    # Keep pressing Stop Ring until every queued Start Ring press has been handled
+    drain_start = time.monotonic()
+    while len(ring_starts) < broker.received[start_topic] and time.monotonic() - drain_start < 10:
+        pressers[0].publish(stop_topic, "PRESS")
+        time.sleep(0.1)
+    pressers[0].publish(stop_topic, "PRESS")
+    drain_seconds = time.monotonic() - drain_start
+    wait_for(lambda: broker.received[state_topic] >= state_updates[0], timeout=5, interval=0.05)
+
+    start_arrivals = [at for at, topic in broker.receive_times if topic == start_topic]
+    for client in pressers:
+        client.loop_stop()
+        client.disconnect()
+    stop_workers(controller, threads)
+    broker.stop()
+    GPIO.reset()
+    received = broker.received[state_topic]
+    result = {
+        "pressers": storm_threads,
+        "storm_seconds": storm_seconds,
+        "discovery_seconds": discovery_seconds,
+        "start_presses": len(start_arrivals),
+        "stop_presses": broker.received[stop_topic],
+        "start_presses_handled": len(ring_starts),
+        "press_to_ring": percentiles([started - arrived for arrived, started in zip(start_arrivals, ring_starts)]),
+        "backlog_drain_seconds": drain_seconds,
+        "ringer_state_updates": state_updates[0],
+        "ringer_state_received": received,
+        "ringer_state_rate_per_second": state_updates[0] / storm_seconds,
+        "delivery_ratio": received / state_updates[0] if state_updates[0] else 0,
+        "hook_to_tone_during_storm": percentiles(hook_to_tone),
+    }
+    logger.info(f"Ring storm: {result['start_presses']} start presses, press to ring p95 "
+                f"{result['press_to_ring'].get('p95_ms', 0):.1f}ms, {result['ringer_state_rate_per_second']:.1f} ringer "
+                f"updates/s, {result['delivery_ratio']:.1%} delivered, hook to tone p95 "
+                f"{result['hook_to_tone_during_storm'].get('p95_ms', 0):.1f}ms")
+    return result
+
+def read_memory_kb(pid):
+    memory = {}
+    with open(f"/proc/{pid}/status", 'r') as status_file:
+        for line in status_file:
+            key, _, value = line.partition(':')
+            if key in ("VmRSS", "VmHWM"):
+                memory[key] = int(value.split()[0])
+    return memory
+
+def bench_startup(work_dir, runs):
+    broker = FakeBroker().start()
+    run_dir = os.path.join(work_dir, 'startup')
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, 'config.yaml'), 'w') as config_file:
+        yaml.safe_dump(benchmark_config(run_dir), config_file)
+    with open(os.path.join(run_dir, 'secrets.yaml'), 'w') as secrets_file:
+        yaml.safe_dump({
+            "mqtt_broker": broker.host, "mqtt_port": broker.port,
+            "mqtt_username": "benchmark", "mqtt_password": "benchmark",
+            "ha_api_token": "", "ha_api_url": "",
+        }, secrets_file)
+    shutil.copy(os.path.join(REPO_DIR, 'entities.yaml'), run_dir)
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([FAKES_DIR, REPO_DIR]), PYTHONUNBUFFERED="1")
+    ready_times, memory = [], []
+    for _ in range(runs):
+        start = time.monotonic()
+        process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, 'main.py')], cwd=run_dir, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        ready = False
+        # main.py rings the bell for 0.3s as its last startup step, so "Rang bell" marks ready
+        for line in process.stderr:
+            if "Rang bell" in line:
+                ready_times.append(time.monotonic() - start)
+                ready = True
+                break
+        if ready:
+            time.sleep(0.5)
+            memory.append(read_memory_kb(process.pid))
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.communicate(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+    broker.stop()
+
+    result = {
+        "runs": runs,
+        "ready": percentiles(ready_times),
+        "rss_kb": max((sample["VmRSS"] for sample in memory), default=None),
+        "peak_rss_kb": max((sample["VmHWM"] for sample in memory), default=None),
+    }
+    logger.info(f"Startup to ready p50 {result['ready'].get('p50_ms', 0):.0f}ms, RSS {result['rss_kb']} kB")
+    return result
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                flat.update(flatten(item, f"{name}[{index}].") if isinstance(item, dict) else {f"{name}[{index}]": item})
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(baseline_path, results):
+    with open(baseline_path, 'r') as baseline_file:
+        baseline = flatten(json.load(baseline_file)["benchmarks"])
+    current = flatten(results["benchmarks"])
+    print(f"{'metric':<70} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, value in current.items():
+        if name in baseline:
+            old = baseline[name]
+            change = f"{(value - old) / old:+.1%}" if old else ""
+            print(f"{name:<70} {old:>12.4g} {value:>12.4g} {change:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and load test the phone control plane on fake hardware")
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/<revision>-<time>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+    parser.add_argument("--only", nargs="+", choices=["pulse", "call_flow", "ring_storm", "startup", "dtmf", "voicemail"])
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--storm-seconds", type=float, default=5.0)
+    parser.add_argument("--storm-threads", type=int, default=4, help="HA clients pressing the ring buttons at once")
+    parser.add_argument("--startup-runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logger.setLevel(logging.INFO)
+    selected = set(args.only or ["pulse", "call_flow", "ring_storm", "startup", "dtmf", "voicemail"])
+    revision = git_revision()
+    results = {
+        "revision": revision,
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "benchmarks": {},
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if "pulse" in selected:
+            results["benchmarks"]["pulse_accuracy"] = bench_pulse_accuracy(work_dir, args.trials, args.seed)
+        if "call_flow" in selected:
+            results["benchmarks"]["call_flow"] = bench_call_flow(work_dir, args.trials, args.seed)
+        if "ring_storm" in selected:
+            results["benchmarks"]["ring_storm"] = bench_ring_storm(work_dir, args.storm_seconds, args.storm_threads, args.seed)
+        if "startup" in selected:
+            results["benchmarks"]["startup"] = bench_startup(work_dir, args.startup_runs)
+        if "dtmf" in selected:
+            results["benchmarks"]["dtmf"] = dtmf_benchmark.run(args.trials, args.seed, work_dir)
+        if "voicemail" in selected:
+            results["benchmarks"]["voicemail"] = voicemail_benchmark.run(args.seed, work_dir)
+            failed = [name for name, passed in results["benchmarks"]["voicemail"]["checks"].items() if not passed]
+            logger.info(f"Voicemail checks: {'all passed' if not failed else 'FAILED ' + ', '.join(failed)}")
+
+    output = args.output or os.path.join(BENCHMARKS_DIR, 'results', f"{revision or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+if __name__ == "__main__":
+    main()
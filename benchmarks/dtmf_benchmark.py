@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import wave
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+from audio_devices import WaveFileSource
+from dtmf import DtmfDetector, ROW_FREQS, COL_FREQS, KEYS
+
+SAMPLE_RATE = 8000
+ALL_KEYS = "".join("".join(row) for row in KEYS)
+
+# name, tone ms, pause ms, SNR dB (None for clean), twist dB (column relative to row), should decode
+TONE_CASES = [
+    ("clean_100ms", 100, 100, None, 0, True),
+    ("clean_40ms", 40, 40, None, 0, True),
+    ("noisy_20db", 70, 60, 20, 0, True),
+    ("noisy_10db", 70, 60, 10, 0, True),
+    ("noisy_6db", 70, 60, 6, 0, True),
+    ("forward_twist_3db", 70, 60, 20, 3, True),
+    ("reverse_twist_6db", 70, 60, 20, -6, True),
+    ("short_20ms", 20, 60, None, 0, False),
+    ("forward_twist_8db", 70, 60, 20, 8, False),
+]
+
+def key_frequencies(key):
+    for row, keys in enumerate(KEYS):
+        if key in keys:
+            return ROW_FREQS[row], COL_FREQS[keys.index(key)]
+
+def synthesize_digits(digits, tone_ms, pause_ms, snr_db, twist_db, rng, amplitude=0.25):
+    parts = [np.zeros(SAMPLE_RATE // 10)]
+    for digit in digits:
+        row_freq, col_freq = key_frequencies(digit)
+        t = np.arange(SAMPLE_RATE * tone_ms // 1000) / SAMPLE_RATE
+        parts.append(amplitude * np.sin(2 * np.pi * row_freq * t + rng.uniform(0, 2 * np.pi))
+                     + amplitude * 10 ** (twist_db / 20) * np.sin(2 * np.pi * col_freq * t + rng.uniform(0, 2 * np.pi)))
+        parts.append(np.zeros(SAMPLE_RATE * pause_ms // 1000))
+    signal = np.concatenate(parts)
+    if snr_db is not None:
+        tone_power = 2 * amplitude ** 2 / 2
+        signal += rng.normal(0, np.sqrt(tone_power / 10 ** (snr_db / 10)), len(signal))
+    return signal
+
+def synthesize_speech(seconds, rng):
+    # Voiced speech stand-in: a harmonic-rich buzz with wandering pitch and syllable-like bursts
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    pitch = rng.uniform(90, 250) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(1, 4) * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    harmonics = sum(rng.uniform(0.2, 1) / k * np.sin(k * phase) for k in range(1, 30))
+    envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3, 6) * t), 0, None)
+    signal = harmonics * envelope + rng.normal(0, 0.02, len(t))
+    return 0.5 * signal / np.abs(signal).max()
+
+def write_wav(path, signal):
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes((np.clip(signal, -1, 1) * 32767).astype('<i2').tobytes())
+
+def decode_file(path, detector):
+    # Reads the file the same way PhoneController.listen_for_dtmf reads the microphone
+    source = WaveFileSource(path)
+    digits = []
+    cpu_start = time.process_time()
+    while (chunk := source.read(detector.hop * 4)):
+        digits += detector.process(chunk)
+    cpu_seconds = time.process_time() - cpu_start
+    audio_seconds = source.wave_file.getnframes() / source.sample_rate
+    source.close()
+    return "".join(digits), cpu_seconds, audio_seconds
+
+def run(trials, seed, work_dir):
+    rng = np.random.default_rng(seed)
+    results = {"cases": [], "talk_off": {}}
+    total_cpu = total_audio = 0.0
+
+    for name, tone_ms, pause_ms, snr_db, twist_db, should_decode in TONE_CASES:
+        correct = digit_errors = 0
+        for trial in range(trials):
+            expected = "".join(rng.permutation(list(ALL_KEYS)))
+            path = os.path.join(work_dir, f"{name}_{trial}.wav")
+            write_wav(path, synthesize_digits(expected, tone_ms, pause_ms, snr_db, twist_db, rng))
+            decoded, cpu_seconds, audio_seconds = decode_file(path, DtmfDetector(SAMPLE_RATE))
+            total_cpu += cpu_seconds
+            total_audio += audio_seconds
+            if should_decode:
+                correct += decoded == expected
+                digit_errors += sum(a != b for a, b in zip(decoded, expected)) + abs(len(decoded) - len(expected))
+            else:
+                correct += decoded == ""
+                digit_errors += len(decoded)
+        results["cases"].append({
+            "name": name,
+            "tone_ms": tone_ms,
+            "pause_ms": pause_ms,
+            "snr_db": snr_db,
+            "twist_db": twist_db,
+            "should_decode": should_decode,
+            "trials": trials,
+            "accuracy": correct / trials,
+            "digit_errors": digit_errors,
+        })
+
+    false_digits = 0
+    speech_seconds = 0.0
+    for trial in range(trials):
+        path = os.path.join(work_dir, f"talk_off_{trial}.wav")
+        write_wav(path, synthesize_speech(10, rng))
+        decoded, cpu_seconds, audio_seconds = decode_file(path, DtmfDetector(SAMPLE_RATE))
+        false_digits += len(decoded)
+        speech_seconds += audio_seconds
+        total_cpu += cpu_seconds
+        total_audio += audio_seconds
+    results["talk_off"] = {"speech_seconds": speech_seconds, "false_digits": false_digits}
+
+    results["cpu"] = {
+        "audio_seconds": total_audio,
+        "cpu_seconds": total_cpu,
+        "core_fraction": total_cpu / total_audio,
+    }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="DTMF decoder accuracy and CPU benchmark")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/dtmf-<time>.json)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run(args.trials, args.seed, work_dir)
+
+    for case in results["cases"]:
+        print(f"{case['name']:<20} accuracy {case['accuracy']:6.1%}  digit errors {case['digit_errors']}")
+    print(f"{'talk_off':<20} {results['talk_off']['false_digits']} false digits in {results['talk_off']['speech_seconds']:.0f}s of speech")
+    print(f"{'cpu':<20} {results['cpu']['core_fraction']:.3%} of one core")
+
+    output = args.output or os.path.join(BENCHMARKS_DIR, 'results', f"dtmf-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
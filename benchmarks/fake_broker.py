@@ -0,0 +1,174 @@
+# Minimal in-process MQTT 3.1.1 broker, enough for paho-mqtt and ha-mqtt-discoverable:
+# CONNECT, PUBLISH at QoS 0-2, retained messages, SUBSCRIBE/UNSUBSCRIBE with wildcards,
+# PINGREQ and DISCONNECT. It counts every PUBLISH it receives so benchmarks can
+# measure what actually reached the broker.
+import socketserver
+import struct
+import time
+from collections import Counter
+from threading import Lock, Thread
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+def topic_matches(topic_filter, topic):
+    filter_parts = topic_filter.split('/')
+    topic_parts = topic.split('/')
+    for index, part in enumerate(filter_parts):
+        if part == '#':
+            return True
+        if index >= len(topic_parts) or (part != '+' and part != topic_parts[index]):
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+def encode_string(value):
+    data = value.encode()
+    return struct.pack('!H', len(data)) + data
+
+class Session(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.write_lock = Lock()
+        self.subscriptions = set()
+        self.server.broker.add_session(self)
+
+    def finish(self):
+        self.server.broker.remove_session(self)
+
+    def send(self, packet_type, flags, body):
+        with self.write_lock:
+            self.request.sendall(bytes([packet_type << 4 | flags]) + encode_length(len(body)) + body)
+
+    def read_exactly(self, count):
+        data = bytearray()
+        while len(data) < count:
+            chunk = self.request.recv(count - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return bytes(data)
+
+    def handle(self):
+        try:
+            while True:
+                header = self.read_exactly(1)[0]
+                length, multiplier = 0, 1
+                while True:
+                    byte = self.read_exactly(1)[0]
+                    length += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    if not byte & 0x80:
+                        break
+                body = self.read_exactly(length) if length else b""
+                if not self.handle_packet(header >> 4, header & 0x0F, body):
+                    return
+        except (ConnectionError, OSError):
+            return
+
+    def handle_packet(self, packet_type, flags, body):
+        broker = self.server.broker
+        if packet_type == CONNECT:
+            self.send(CONNACK, 0, b"\x00\x00")
+        elif packet_type == PUBLISH:
+            qos = (flags >> 1) & 0x03
+            topic_length = struct.unpack('!H', body[:2])[0]
+            topic = body[2:2 + topic_length].decode()
+            offset = 2 + topic_length
+            if qos:
+                packet_id = body[offset:offset + 2]
+                offset += 2
+                self.send(PUBACK if qos == 1 else PUBREC, 0, packet_id)
+            broker.publish(topic, body[offset:], bool(flags & 0x01))
+        elif packet_type == PUBREL:
+            self.send(PUBCOMP, 0, body[:2])
+        elif packet_type == SUBSCRIBE:
+            packet_id, offset, granted, filters = body[:2], 2, bytearray(), []
+            while offset < len(body):
+                filter_length = struct.unpack('!H', body[offset:offset + 2])[0]
+                filters.append(body[offset + 2:offset + 2 + filter_length].decode())
+                offset += 3 + filter_length
+                granted.append(0)
+            self.subscriptions.update(filters)
+            self.send(SUBACK, 0, packet_id + bytes(granted))
+            for topic, payload in broker.retained_matching(filters):
+                self.deliver(topic, payload, retain=True)
+        elif packet_type == UNSUBSCRIBE:
+            offset = 2
+            while offset < len(body):
+                filter_length = struct.unpack('!H', body[offset:offset + 2])[0]
+                self.subscriptions.discard(body[offset + 2:offset + 2 + filter_length].decode())
+                offset += 2 + filter_length
+            self.send(UNSUBACK, 0, body[:2])
+        elif packet_type == PINGREQ:
+            self.send(PINGRESP, 0, b"")
+        elif packet_type == DISCONNECT:
+            return False
+        return True
+
+    def deliver(self, topic, payload, retain=False):
+        try:
+            self.send(PUBLISH, 1 if retain else 0, encode_string(topic) + payload)
+        except OSError:
+            pass
+
+class ThreadedServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class FakeBroker:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = ThreadedServer((host, port), Session)
+        self.server.broker = self
+        self.host, self.port = self.server.server_address
+        self.lock = Lock()
+        self.sessions = set()
+        self.retained = {}
+        self.received = Counter()
+        self.receive_times = []
+
+    def start(self):
+        Thread(target=self.server.serve_forever, name="fake_broker", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_session(self, session):
+        with self.lock:
+            self.sessions.add(session)
+
+    def remove_session(self, session):
+        with self.lock:
+            self.sessions.discard(session)
+
+    def publish(self, topic, payload, retain):
+        with self.lock:
+            self.received[topic] += 1
+            self.receive_times.append((time.monotonic(), topic))
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+            subscribers = [session for session in self.sessions
+                           if any(topic_matches(topic_filter, topic) for topic_filter in session.subscriptions)]
+        for session in subscribers:
+            session.deliver(topic, payload)
+
+    def retained_matching(self, filters):
+        with self.lock:
+            return [(topic, payload) for topic, payload in self.retained.items()
+                    if any(topic_matches(topic_filter, topic) for topic_filter in filters)]
+
+    def reset_counts(self):
+        with self.lock:
+            self.received.clear()
+            self.receive_times.clear()
@@ -0,0 +1,59 @@
+# Stand-in for RPi.GPIO so the phone can run on a plain Linux box. Inputs are either
+# fixed levels or callables (usually driven by a clock) set by the benchmark.
+import time
+
+BCM = 11
+BOARD = 10
+IN = 1
+OUT = 0
+HIGH = 1
+LOW = 0
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+
+mode = None
+levels = {}
+sources = {}
+outputs = {}
+output_log = []
+
+def setmode(new_mode):
+    global mode
+    mode = new_mode
+
+def setwarnings(flag):
+    pass
+
+def setup(pin, direction, pull_up_down=PUD_OFF, initial=None):
+    if direction == OUT:
+        outputs[pin] = LOW if initial is None else initial
+    elif pin not in levels:
+        levels[pin] = HIGH if pull_up_down == PUD_UP else LOW
+
+def input(pin):
+    if pin in sources:
+        return sources[pin]()
+    if pin in outputs:
+        return outputs[pin]
+    return levels.get(pin, LOW)
+
+def output(pin, value):
+    outputs[pin] = value
+    output_log.append((time.monotonic(), pin, value))
+
+def cleanup():
+    sources.clear()
+
+def set_input(pin, level):
+    sources.pop(pin, None)
+    levels[pin] = level
+
+def set_input_source(pin, source):
+    sources[pin] = source
+
+def reset():
+    levels.clear()
+    sources.clear()
+    outputs.clear()
+    output_log.clear()
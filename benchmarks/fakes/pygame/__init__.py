@@ -0,0 +1,3 @@
+# Stand-in for pygame with just the mixer calls the phone uses. Every play is logged
+# with a timestamp so benchmarks can measure when a tone would have started.
+from pygame import mixer
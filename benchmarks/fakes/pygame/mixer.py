@@ -0,0 +1,58 @@
+import time
+from threading import Lock
+
+events = []
+events_lock = Lock()
+initialized = None
+
+def init(frequency=44100, size=-16, channels=2, buffer=512):
+    global initialized
+    initialized = (frequency, size, channels)
+
+def get_init():
+    return initialized
+
+def quit():
+    global initialized
+    initialized = None
+
+def stop():
+    log_event("mixer", "stop")
+
+def log_event(name, action):
+    with events_lock:
+        events.append((time.monotonic(), name, action))
+
+def clear_events():
+    with events_lock:
+        events.clear()
+
+class Channel:
+    def __init__(self, sound):
+        self.sound = sound
+
+    def get_busy(self):
+        return False
+
+    def get_queue(self):
+        return None
+
+    def queue(self, sound):
+        sound.play()
+
+    def stop(self):
+        self.sound.stop()
+
+class Sound:
+    def __init__(self, file=None, buffer=None):
+        self.name = file if isinstance(file, str) else "buffer"
+
+    def play(self, loops=0, maxtime=0, fade_ms=0):
+        log_event(self.name, "play")
+        return Channel(self)
+
+    def stop(self):
+        log_event(self.name, "stop")
+
+    def get_length(self):
+        return 0.0
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import wave
+from threading import Event
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+from audio_devices import WaveFileSource
+from dtmf_benchmark import SAMPLE_RATE, synthesize_speech, write_wav
+from voicemail import Voicemail
+
+def synthesize_silence(seconds, rng, level_db=-60):
+    return rng.normal(0, 10 ** (level_db / 20), int(SAMPLE_RATE * seconds))
+
+def read_wav(path):
+    with wave.open(path, 'rb') as wav_file:
+        return np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype='<i2').astype(np.float64)
+
+def record_file(voicemail, path, stop_event=None):
+    # Records the file the same way PhoneController.take_message records a caller
+    source = WaveFileSource(path)
+    try:
+        return voicemail.record(source, stop_event or Event())
+    finally:
+        source.close()
+
+def audio_file_size(voicemail, message):
+    return os.path.getsize(os.path.join(voicemail.directory, message['audio_file']))
+
+def run(seed, work_dir):
+    rng = np.random.default_rng(seed)
+    checks = {}
+    results = {"checks": checks}
+
+    speech_path = os.path.join(work_dir, "speech.wav")
+    write_wav(speech_path, synthesize_speech(10, rng))
+    speech = read_wav(speech_path)
+
+    # Record from a file-backed source and play it back in one-second chunks
+    voicemail = Voicemail(os.path.join(work_dir, "record"), quota_bytes=10 ** 8, silence_seconds=3)
+    cpu_start = time.process_time()
+    message = record_file(voicemail, speech_path)
+    record_cpu = time.process_time() - cpu_start
+    checks["record_from_wave"] = (
+        message is not None and message['codec'] == "mulaw" and abs(message['duration'] - len(speech) / SAMPLE_RATE) < 0.01
+    )
+    cpu_start = time.process_time()
+    chunks = list(voicemail.iter_chunks(message, chunk_frames=SAMPLE_RATE))
+    playback_cpu = time.process_time() - cpu_start
+    decoded = np.frombuffer(b"".join(chunks), dtype='<i2').astype(np.float64)
+    checks["playback_chunking"] = (
+        len(chunks) == -(-len(speech) // SAMPLE_RATE)
+        and all(len(chunk) == SAMPLE_RATE * 2 for chunk in chunks[:-1])
+        and len(decoded) == len(speech)
+    )
+    with wave.open(voicemail.chunk_to_wav(message, chunks[0]), 'rb') as wav_file:
+        checks["chunk_to_wav"] = (wav_file.getframerate(), wav_file.getnchannels(), wav_file.getsampwidth(), wav_file.getnframes()) == (SAMPLE_RATE, 1, 2, SAMPLE_RATE)
+    snr = float(10 * np.log10(np.sum(speech ** 2) / np.sum((speech - decoded) ** 2))) if len(decoded) == len(speech) else 0.0
+    checks["playback_quality"] = snr >= 30
+    stored = audio_file_size(voicemail, message)
+    results["storage"] = {
+        "pcm_bytes": len(speech) * 2,
+        "stored_bytes": stored,
+        "ratio": stored / (len(speech) * 2),
+        "snr_db": snr,
+    }
+    results["cpu"] = {
+        "record_ms_per_audio_second": record_cpu / message['duration'] * 1000,
+        "playback_ms_per_audio_second": playback_cpu / message['duration'] * 1000,
+    }
+
+    # Silence: a long pause ends the message, and a message with no voice at all is thrown away
+    pause_path = os.path.join(work_dir, "pause.wav")
+    write_wav(pause_path, np.concatenate([synthesize_speech(2, rng), synthesize_silence(10, rng), synthesize_speech(2, rng)]))
+    paused = record_file(voicemail, pause_path)
+    checks["silence_cutoff"] = paused is not None and 4.5 <= paused['duration'] <= 5.5
+    silent_path = os.path.join(work_dir, "silent.wav")
+    write_wav(silent_path, synthesize_silence(10, rng))
+    count = voicemail.message_count()
+    checks["silence_discard"] = record_file(voicemail, silent_path) is None and voicemail.message_count() == count
+
+    # A caller hanging up ends the message
+    stop_event = Event()
+    stop_event.set()
+    checks["stop_event"] = record_file(voicemail, speech_path, stop_event) is None
+
+    # Quota: a message is cut short at the quota, a full box of unheard messages refuses new
+    # ones, and heard messages are pruned oldest first to make room
+    box = Voicemail(os.path.join(work_dir, "quota"), quota_bytes=int(stored * 2.5), silence_seconds=3)
+    first, second, third = (record_file(box, speech_path) for _ in range(3))
+    checks["quota_truncates"] = (
+        first is not None and second is not None and third is not None and third['duration'] < first['duration']
+        and box.usage() >= box.quota_bytes
+    )
+    checks["quota_refuses_when_unheard"] = record_file(box, speech_path) is None and box.message_count() == 3
+    box.mark_heard(first)
+    box.mark_heard(second)
+    pruned = record_file(box, speech_path)
+    names = {message['name'] for message in box.messages()}
+    checks["quota_prunes_heard"] = (
+        pruned is not None and first['name'] not in names and third['name'] in names and pruned['name'] in names
+    )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Voicemail recording, storage and playback checks on file-backed audio")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="Results file (default: benchmarks/results/voicemail-<time>.json)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run(args.seed, work_dir)
+
+    for name, passed in results["checks"].items():
+        print(f"{name:<28} {'ok' if passed else 'FAILED'}")
+    print(f"{'storage':<28} {results['storage']['ratio']:.1%} of raw PCM, {results['storage']['snr_db']:.1f} dB SNR")
+    print(f"{'cpu':<28} record {results['cpu']['record_ms_per_audio_second']:.2f} ms, playback {results['cpu']['playback_ms_per_audio_second']:.2f} ms per audio second")
+
+    output = args.output or os.path.join(BENCHMARKS_DIR, 'results', f"voicemail-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"Results written to {output}")
+    if not all(results["checks"].values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import math
+import sqlite3
+import time
+import logging
+from datetime import date, datetime, timedelta
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# Action latencies are rolled up into log-spaced buckets, each 10% wider than the last
+LATENCY_BUCKET_BASE_MS = 0.1
+LATENCY_BUCKET_GROWTH = 1.1
+
+class CallLog:
+    def __init__(self, path, stats_days=30):
+        self.path = path
+        self.stats_days = stats_days
+        self.lock = Lock()
+        # One connection shared by the hook thread (writes) and the stats thread (reads)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        # Append-only call detail records
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS calls ("
+            "id INTEGER PRIMARY KEY, "
+            "off_hook_time REAL NOT NULL, "
+            "digits TEXT NOT NULL, "
+            "action TEXT, "
+            "action_latency REAL, "
+            "outcome TEXT NOT NULL, "
+            "duration REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS calls_off_hook_time ON calls (off_hook_time)")
+        # Per-day rollups kept up to date on every insert, so stats never rescan the calls table
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS daily_digits ("
+            "day TEXT NOT NULL, digits TEXT NOT NULL, calls INTEGER NOT NULL, "
+            "PRIMARY KEY (day, digits)) WITHOUT ROWID"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS daily_latency ("
+            "day TEXT NOT NULL, bucket INTEGER NOT NULL, calls INTEGER NOT NULL, "
+            "PRIMARY KEY (day, bucket)) WITHOUT ROWID"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS daily_calls ("
+            "day TEXT NOT NULL PRIMARY KEY, calls INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        logger.info(f"Call log opened at {path}")
+
+    def record_call(self, off_hook_time, duration, numbers):
+        # One row per number handled during the call; a call with nothing handled still gets a row
+        if not numbers:
+            numbers = [{"digits": "", "action": None, "action_latency": None, "outcome": "no_digits"}]
+        day = date.fromtimestamp(off_hook_time).isoformat()
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                for number in numbers:
+                    self.db.execute(
+                        "INSERT INTO calls (off_hook_time, digits, action, action_latency, outcome, duration) VALUES (?, ?, ?, ?, ?, ?)",
+                        (off_hook_time, number["digits"], number["action"], number["action_latency"], number["outcome"], duration)
+                    )
+                    # Numbers hung up on mid-dial were never completed, so they don't count toward most dialed
+                    if number["outcome"] not in ("abandoned", "no_digits"):
+                        self.db.execute(
+                            "INSERT INTO daily_digits (day, digits, calls) VALUES (?, ?, 1) "
+                            "ON CONFLICT (day, digits) DO UPDATE SET calls = calls + 1",
+                            (day, number["digits"])
+                        )
+                    if number["action_latency"] is not None:
+                        self.db.execute(
+                            "INSERT INTO daily_latency (day, bucket, calls) VALUES (?, ?, 1) "
+                            "ON CONFLICT (day, bucket) DO UPDATE SET calls = calls + 1",
+                            (day, latency_bucket(number["action_latency"]))
+                        )
+                self.db.execute(
+                    "INSERT INTO daily_calls (day, calls) VALUES (?, 1) "
+                    "ON CONFLICT (day) DO UPDATE SET calls = calls + 1",
+                    (day,)
+                )
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        logger.debug(f"Recorded call: numbers={[number['digits'] for number in numbers]} outcomes={[number['outcome'] for number in numbers]} duration={duration:.1f}s")
+
+    def calls_since(self, day):
+        with self.lock:
+            return self.db.execute("SELECT COALESCE(SUM(calls), 0) FROM daily_calls WHERE day >= ?", (day,)).fetchone()[0]
+
+    def most_dialed(self, day, limit=1):
+        with self.lock:
+            return self.db.execute(
+                "SELECT digits, SUM(calls) AS total FROM daily_digits WHERE day >= ? AND digits != '' "
+                "GROUP BY digits ORDER BY total DESC, digits LIMIT ?",
+                (day, limit)
+            ).fetchall()
+
+    def latency_percentile(self, day, percentile):
+        with self.lock:
+            histogram = self.db.execute(
+                "SELECT bucket, SUM(calls) FROM daily_latency WHERE day >= ? GROUP BY bucket ORDER BY bucket",
+                (day,)
+            ).fetchall()
+        total = sum(calls for _, calls in histogram)
+        if not total:
+            return None
+        # Nearest-rank percentile, reported as the upper edge of the bucket it falls in
+        rank = math.ceil(total * percentile / 100)
+        seen = 0
+        for bucket, calls in histogram:
+            seen += calls
+            if seen >= rank:
+                return bucket_upper_ms(bucket) / 1000
+
+    def rollups(self, now=None):
+        today = datetime.fromtimestamp(time.time() if now is None else now).date()
+        window_start = (today - timedelta(days=self.stats_days - 1)).isoformat()
+        top = self.most_dialed(window_start)
+        p50 = self.latency_percentile(window_start, 50)
+        p95 = self.latency_percentile(window_start, 95)
+        return {
+            "calls_today": self.calls_since(today.isoformat()),
+            "most_dialed_number": top[0][0] if top else "none",
+            "action_latency_p50": round(p50 * 1000, 1) if p50 is not None else 0,
+            "action_latency_p95": round(p95 * 1000, 1) if p95 is not None else 0,
+        }
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+def latency_bucket(latency):
+    latency_ms = max(latency * 1000, LATENCY_BUCKET_BASE_MS)
+    return math.ceil(math.log(latency_ms / LATENCY_BUCKET_BASE_MS, LATENCY_BUCKET_GROWTH))
+
+def bucket_upper_ms(bucket):
+    return LATENCY_BUCKET_BASE_MS * LATENCY_BUCKET_GROWTH ** bucket
@@ -0,0 +1,120 @@
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROW_FREQS = [697, 770, 852, 941]
+COL_FREQS = [1209, 1336, 1477, 1633]
+KEYS = [
+    ["1", "2", "3", "A"],
+    ["4", "5", "6", "B"],
+    ["7", "8", "9", "C"],
+    ["*", "0", "#", "D"],
+]
+
+class DtmfDetector:
+    def __init__(self, sample_rate=8000, block_size=205, min_level=-40.0, min_tone_ratio=0.5,
+                 max_forward_twist=4.0, max_reverse_twist=8.0, min_peak_ratio=6.0,
+                 max_harmonic_ratio=-12.0, max_block_fade=4.0, min_blocks=2, min_gap_blocks=2):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        # Blocks overlap by half, so a tone only has to last about 1.5 blocks to fill two of them
+        self.hop = block_size // 2
+        # Thresholds are given in dB and kept as power ratios
+        self.min_energy = block_size * (10 ** (min_level / 10)) * (32768 ** 2) / 2
+        self.min_tone_ratio = min_tone_ratio
+        self.max_forward_twist = 10 ** (max_forward_twist / 10)
+        self.max_reverse_twist = 10 ** (max_reverse_twist / 10)
+        self.min_peak_ratio = 10 ** (min_peak_ratio / 10)
+        self.max_harmonic_ratio = 10 ** (max_harmonic_ratio / 10)
+        self.max_block_fade = 10 ** (max_block_fade / 10)
+        self.min_blocks = min_blocks
+        self.min_gap_blocks = min_gap_blocks
+
+        # Goertzel at the 8 DTMF frequencies and the column tones' second harmonics, evaluated
+        # for many blocks at once as one matrix product against a precomputed basis. Row
+        # harmonics are left out, they sit too close to the column tones to tell apart
+        freqs = np.array(ROW_FREQS + COL_FREQS + [2 * f for f in COL_FREQS], dtype=np.float64)
+        phase = 2 * np.pi * np.outer(np.arange(block_size), freqs) / sample_rate
+        self.basis = np.concatenate([np.cos(phase), np.sin(phase)], axis=1).astype(np.float32)
+        # Scales a bin's power so a pure tone compares 1:1 with the block energy
+        self.power_scale = 2.0 / block_size
+
+        self.reset()
+
+    def reset(self):
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.candidate = None
+        self.candidate_blocks = 0
+        self.last_digit = None
+        self.gap_blocks = 0
+
+    def process(self, audio):
+        if isinstance(audio, (bytes, bytearray)):
+            audio = np.frombuffer(audio, dtype='<i2')
+        samples = np.concatenate([self.pending, audio.astype(np.float32)])
+        if len(samples) < self.block_size:
+            self.pending = samples
+            return []
+        blocks = np.lib.stride_tricks.sliding_window_view(samples, self.block_size)[::self.hop]
+        self.pending = samples[len(blocks) * self.hop:]
+        return self.track(self.detect_blocks(blocks))
+
+    def detect_blocks(self, blocks):
+        projections = blocks @ self.basis
+        half = projections.shape[1] // 2
+        power = (projections[:, :half] ** 2 + projections[:, half:] ** 2) * self.power_scale
+        first_half = np.einsum('ij,ij->i', blocks[:, :self.hop], blocks[:, :self.hop])
+        second_half = np.einsum('ij,ij->i', blocks[:, self.hop:], blocks[:, self.hop:])
+        energy = first_half + second_half
+
+        rows, cols = power[:, 0:4], power[:, 4:8]
+        col_harmonics = power[:, 8:12]
+        index = np.arange(len(blocks))
+        row = rows.argmax(axis=1)
+        col = cols.argmax(axis=1)
+        row_power = rows[index, row]
+        col_power = cols[index, col]
+        # Strongest competing tone within each group
+        row_next = np.partition(rows, -2, axis=1)[:, -2]
+        col_next = np.partition(cols, -2, axis=1)[:, -2]
+
+        valid = (
+            (energy >= self.min_energy)
+            # The tone has to fill the whole block, not just clip one end of it
+            & (np.maximum(first_half, second_half) <= self.max_block_fade * np.minimum(first_half, second_half))
+            # SNR: the two tones must carry most of the block's energy
+            & (row_power + col_power >= self.min_tone_ratio * energy)
+            # Twist: column (high) tone may be louder than the row tone, but only so much either way
+            & (col_power <= self.max_forward_twist * row_power)
+            & (row_power <= self.max_reverse_twist * col_power)
+            & (row_power >= self.min_peak_ratio * row_next)
+            & (col_power >= self.min_peak_ratio * col_next)
+            # Talk-off: voice is rich in harmonics, true DTMF tones are not
+            & (col_harmonics[index, col] <= self.max_harmonic_ratio * col_power)
+        )
+        return [KEYS[r][c] if ok else None for r, c, ok in zip(row, col, valid)]
+
+    def track(self, block_keys):
+        # A digit is reported once it holds for min_blocks consecutive blocks. The same
+        # digit is only reported again after it has been absent for min_gap_blocks, so a
+        # single corrupted block in the middle of a long press doesn't double it
+        digits = []
+        for key in block_keys:
+            if key is not None and key == self.last_digit and self.gap_blocks < self.min_gap_blocks:
+                self.gap_blocks = 0
+                continue
+            self.gap_blocks += 1
+            if key is not None and key == self.candidate:
+                self.candidate_blocks += 1
+            else:
+                self.candidate = key
+                self.candidate_blocks = 1
+            if key is not None and self.candidate_blocks >= self.min_blocks:
+                digits.append(key)
+                self.last_digit = key
+                self.gap_blocks = 0
+                self.candidate = None
+                self.candidate_blocks = 0
+                logger.debug(f"DTMF digit detected: {key}")
+        return digits
@@ -3,7 +3,7 @@ import RPi.GPIO as GPIO
 import time
 import logging
 from ha_mqtt_discoverable import Settings, DeviceInfo
-from ha_mqtt_discoverable.sensors import BinarySensor, BinarySensorInfo, Number, NumberInfo, Button, ButtonInfo
+from ha_mqtt_discoverable.sensors import BinarySensor, BinarySensorInfo, Number, NumberInfo, Button, ButtonInfo, Sensor, SensorInfo
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +11,10 @@ class HomeAssistantClient:
     def __init__(self, broker, port, username, password, token, api_url, config, entities, phone_controller):
         self.token = token
         self.api_url = api_url
+        # Set before connecting, on_connect can run on the network thread before __init__ returns
+        self.config = config
+        self.entities = entities
+        self.phone_controller = phone_controller
         self.client = mqtt.Client()
         self.client.username_pw_set(username, password)
         self.client.on_connect = self.on_connect
@@ -18,9 +22,6 @@ class HomeAssistantClient:
         self.retained_values = {}
         self.client.connect(broker, port, 60)
         self.client.loop_start()
-        self.config = config
-        self.entities = entities
-        self.phone_controller = phone_controller
         logger.info("HomeAssistantClient initialized and connected to MQTT broker")
 
         self.device_info = DeviceInfo(
@@ -41,6 +42,7 @@ class HomeAssistantClient:
     def setup_discovery(self):
         self.setup_buttons()
         self.setup_binary_sensors()
+        self.setup_sensors()
         self.setup_number_entities()
 
     def setup_buttons(self):
@@ -63,7 +65,24 @@ class HomeAssistantClient:
             binary_sensor = BinarySensor(sensor_settings)
             binary_sensor.write_config()
             setattr(self, f"{sensor['unique_id']}_entity", binary_sensor)
-            self.update_binary_sensor(sensor['unique_id'], GPIO.input(self.config[sensor['gpio_pin']]) == GPIO.HIGH)
+            if 'gpio_pin' in sensor:
+                self.update_binary_sensor(sensor['unique_id'], GPIO.input(self.config[sensor['gpio_pin']]) == GPIO.HIGH)
+            else:
+                self.update_binary_sensor(sensor['unique_id'], False)
+
+    def setup_sensors(self):
+        for sensor in self.entities.get('sensors', []):
+            sensor_info = SensorInfo(
+                name=sensor['name'],
+                device=self.device_info,
+                unique_id=sensor['unique_id'],
+                unit_of_measurement=sensor.get('unit_of_measurement'),
+                entity_category=sensor.get('entity_category')
+            )
+            sensor_settings = Settings(mqtt=self.mqtt_settings, entity=sensor_info)
+            sensor_entity = Sensor(sensor_settings)
+            sensor_entity.write_config()
+            setattr(self, f"{sensor['unique_id']}_entity", sensor_entity)
 
     def setup_number_entities(self):
         for number in self.entities['number_entities']:
@@ -121,3 +140,8 @@ class HomeAssistantClient:
         binary_sensor = getattr(self, f"{unique_id}_entity", None)
         if binary_sensor:
             binary_sensor.update_state(state)
+
+    def update_sensor(self, unique_id, value):
+        sensor = getattr(self, f"{unique_id}_entity", None)
+        if sensor:
+            sensor.set_state(value)
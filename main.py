@@ -6,8 +6,11 @@ import logging
 import signal
 import sys
 from threading import Thread
+from call_log import CallLog
 from home_assistant_client import HomeAssistantClient
 from phone_controller import PhoneController
+from voicemail import Voicemail
+from worker_watchdog import Watchdog
 from utils import get_ip_address
 
 # Load configuration from YAML files
@@ -66,20 +69,49 @@ def main():
         phone_controller=None  # We'll set this after creating phone_controller
     )
 
+    call_log = CallLog(config['call_log_path'], config.get('call_stats_days', 30))
+
+    voicemail = None
+    if config.get('enable_voicemail', False):
+        voicemail = Voicemail(
+            config['voicemail_dir'],
+            quota_bytes=int(config['voicemail_quota_mb'] * 1024 * 1024),
+            max_message_seconds=config['voicemail_max_seconds'],
+            silence_seconds=config['voicemail_silence_seconds'],
+            silence_level=config['voicemail_silence_level']
+        )
+
+    dtmf_detector = None
+    if config.get('enable_dtmf', False):
+        # numpy is only needed for touch-tone decoding
+        from dtmf import DtmfDetector
+        dtmf_detector = DtmfDetector()
+
+    watchdog = Watchdog(
+        ha_client,
+        config['watchdog_diagnostics_path'],
+        deadline=config['watchdog_deadline'],
+        restart_after=config['watchdog_restart_after'] if config.get('watchdog_restart', False) else None
+    )
+
     global phone_controller
-    phone_controller = PhoneController(config, sounds, ha_client)
+    phone_controller = PhoneController(config, sounds, ha_client, call_log, voicemail, dtmf_detector, watchdog)
     ha_client.phone_controller = phone_controller  # Now we can set it
 
-    hook_thread = Thread(target=phone_controller.handle_hook_switch_and_dial)
-    timeout_thread = Thread(target=phone_controller.check_dial_timeout)
-    hook_thread.start()
-    timeout_thread.start()
+    restart = config.get('watchdog_restart', False)
+    watchdog.add_worker("hook", phone_controller.handle_hook_switch_and_dial, restart=restart)
+    watchdog.add_worker("dial_timeout", phone_controller.check_dial_timeout, restart=restart)
+    if dtmf_detector:
+        watchdog.add_worker("dtmf", phone_controller.listen_for_dtmf, restart=restart, daemon=True)
+    stats_thread = Thread(target=phone_controller.publish_call_stats, daemon=True)
+    stats_thread.start()
+    if config.get('enable_watchdog', False):
+        watchdog.start()
     
     # Ring the bell after initialization
     phone_controller.ring_bell(0.3)
     
-    hook_thread.join()
-    timeout_thread.join()
+    watchdog.join_workers()
 
 if __name__ == "__main__":
     main()
@@ -1,17 +1,26 @@
 import RPi.GPIO as GPIO
 import time
 import pygame
-from threading import Thread, Event
+from threading import Thread, Event, Lock
 import logging
+from audio_devices import open_audio_input
 
 logger = logging.getLogger(__name__)
 
 class PhoneController:
-    def __init__(self, config, sounds, ha_client):
+    def __init__(self, config, sounds, ha_client, call_log=None, voicemail=None, dtmf_detector=None, watchdog=None):
         self.config = config
         self.sounds = sounds
         self.ha_client = ha_client
+        self.call_log = call_log
+        self.voicemail = voicemail
+        self.dtmf_detector = dtmf_detector
+        self.watchdog = watchdog
         self.ring_stop_event = Event()
+        self.recording_stop_event = Event()
+        self.playback_stop_event = Event()
+        self.stutter_stop_event = Event()
+        self.stutter_lock = Lock()
         self.stop_event = Event()
         self.setup_gpio()
         self.on_hook = GPIO.input(config['hook_switch_pin']) == GPIO.HIGH
@@ -28,7 +37,13 @@ class PhoneController:
             "11": lambda: self.ha_client.call_service("trigger_wyoming_button") if config['enable_ha_mqtt'] else logger.debug("Dial action 11 triggered"),
             "15": lambda: self.play_sound("ringback"),
         }
+        if voicemail:
+            self.dial_actions[config['voicemail_code']] = self.play_messages
         self.sensor_states = {}
+        self.current_call = None
+        self.call_lock = Lock()
+        if voicemail:
+            self.publish_voicemail_count()
         logger.info("PhoneController initialized")
 
     def setup_gpio(self):
@@ -45,10 +60,33 @@ class PhoneController:
             logger.info(f"Playing sound: {sound_name} {'in loop' if loop else 'once'}")
 
     def stop_all_sounds(self):
+        with self.stutter_lock:
+            self.stutter_stop_event.set()
         for sound in self.sounds.values():
             sound.stop()
         logger.info("Stopped all sounds")
 
+    def play_stutter_dial_tone(self):
+        self.stutter_stop_event.clear()
+        Thread(target=self.stutter_dial_tone, daemon=True).start()
+
+    def stutter_dial_tone(self, bursts=10, burst_seconds=0.1):
+        # Message-waiting cadence cut from the regular dial tone: short on/off bursts, then steady.
+        # Any stop_all_sounds (dialing, hanging up) ends it
+        dial_tone = self.sounds.get("dial_tone")
+        if dial_tone is None:
+            return
+        for _ in range(bursts):
+            with self.stutter_lock:
+                if self.stutter_stop_event.is_set():
+                    return
+                dial_tone.play(0, maxtime=int(burst_seconds * 1000))
+            if self.stutter_stop_event.wait(2 * burst_seconds):
+                return
+        with self.stutter_lock:
+            if not self.stutter_stop_event.is_set():
+                dial_tone.play(-1)
+
     def ring_bell(self, duration):
         GPIO.output(self.config['ringer_control_pin'], GPIO.HIGH)
         time.sleep(duration)
@@ -58,6 +96,7 @@ class PhoneController:
     def handle_hook_switch_and_dial(self):
         previous_hook_state = GPIO.input(self.config['hook_switch_pin'])
         while not self.stop_event.is_set():
+            self.heartbeat("hook")
             current_hook_state = GPIO.input(self.config['hook_switch_pin'])
             if current_hook_state != previous_hook_state:
                 hook_switch_state = "on-hook" if current_hook_state == GPIO.HIGH else "off-hook"
@@ -69,44 +108,104 @@ class PhoneController:
                 if not self.on_hook:
                     self.on_hook = True
                     self.stop_all_sounds()
+                    self.playback_stop_event.set()
+                    self.end_call()
                     self.dialed_number = ""
                     self.dial_timeout_occurred = False
                     logger.info("Handset on-hook")
             else:
                 if self.on_hook:
                     self.on_hook = False
-                    self.play_sound("dial_tone", loop=True)
+                    self.recording_stop_event.set()
+                    if self.voicemail and self.voicemail.has_new_messages():
+                        self.play_stutter_dial_tone()
+                        dial_tone = "stutter dial tone"
+                    else:
+                        self.play_sound("dial_tone", loop=True)
+                        dial_tone = "dial tone"
                     self.dial_tone_start_time = time.time()
-                    logger.info("Handset off-hook, playing dial tone")
+                    self.start_call()
+                    logger.info(f"Handset off-hook, playing {dial_tone}")
                 elif not self.dial_timeout_occurred and (time.time() - self.dial_tone_start_time > self.dial_tone_timeout):
                     self.play_busy_signal()
                 elif self.dial_timeout_occurred and (time.time() - self.busy_signal_start_time > self.busy_signal_timeout * 60):
                     self.stop_all_sounds()
 
-                while not self.stop_event.is_set() and GPIO.input(self.config['dial_state_pin']) == GPIO.LOW:
-                    time.sleep(0.1)
-                if not self.stop_event.is_set() and GPIO.input(self.config['hook_switch_pin']) == GPIO.LOW and not self.dial_timeout_occurred:
+                if GPIO.input(self.config['dial_state_pin']) == GPIO.HIGH and GPIO.input(self.config['hook_switch_pin']) == GPIO.LOW and not self.dial_timeout_occurred:
                     self.stop_all_sounds()
                     self.count_pulses()
+                    self.heartbeat("hook")
                     time.sleep(0.2)
+                    self.heartbeat("hook")
             time.sleep(0.1)
 
     def count_pulses(self):
         pulse_count = 0
         while GPIO.input(self.config['hook_switch_pin']) == GPIO.LOW and not self.stop_event.is_set():
+            self.heartbeat("hook")
             if GPIO.input(self.config['pulse_pin']) == GPIO.LOW:
                 time.sleep(0.1)
                 while GPIO.input(self.config['pulse_pin']) == GPIO.LOW:
+                    self.heartbeat("hook")
                     pulse_count += 1
                     time.sleep(0.1)
-                self.dialed_number += str(pulse_count)
+                # A rotary 0 sends ten pulses; store it as "0" so pulse and touch-tone numbers match
+                digit = "0" if pulse_count == 10 else str(pulse_count)
+                self.dialed_number += digit
                 self.last_pulse_time = time.time()
-                logger.debug(f"Dialed digit: {pulse_count}")
+                logger.debug(f"Dialed digit: {digit}")
                 pulse_count = 0
             time.sleep(0.1)
 
+    def listen_for_dtmf(self):
+        source = None
+        rejected = False
+        while not self.stop_event.is_set():
+            self.heartbeat("dtmf")
+            if self.on_hook:
+                if source:
+                    source.close()
+                    source = None
+                    self.dtmf_detector.reset()
+                rejected = False
+                time.sleep(0.1)
+                continue
+            if rejected:
+                # Wrong input format; try again on the next off-hook rather than every pass
+                time.sleep(0.1)
+                continue
+            if source is None:
+                source = open_audio_input(self.config['dtmf_input'], self.dtmf_detector.sample_rate)
+                if (source.sample_rate, source.channels, source.sample_width) != (self.dtmf_detector.sample_rate, 1, 2):
+                    logger.error(
+                        f"DTMF input {self.config['dtmf_input']} is {source.sample_rate} Hz, {source.channels} ch, "
+                        f"{source.sample_width * 8}-bit; the decoder needs {self.dtmf_detector.sample_rate} Hz mono 16-bit"
+                    )
+                    source.close()
+                    source = None
+                    rejected = True
+                    continue
+            chunk = source.read(self.dtmf_detector.hop * 4)
+            if not chunk:
+                time.sleep(0.1)
+                continue
+            for digit in self.dtmf_detector.process(chunk):
+                self.add_dtmf_digit(digit)
+        if source:
+            source.close()
+
+    def add_dtmf_digit(self, digit):
+        if self.dial_timeout_occurred:
+            return
+        if not self.dialed_number:
+            self.stop_all_sounds()
+        self.dialed_number += digit
+        self.last_pulse_time = time.time()
+        logger.debug(f"Dialed digit: {digit}")
+
     def check_dial_timeout(self):
         while not self.stop_event.is_set():
+            self.heartbeat("dial_timeout")
             if not self.on_hook and self.dialed_number and (time.time() - self.last_pulse_time > self.dial_timeout):
                 logger.info(f"Complete dialed number: {self.dialed_number}")
                 self.handle_dialed_number(self.dialed_number)
@@ -122,11 +221,14 @@ class PhoneController:
         self.dial_timeout_occurred = True
         logger.info("Playing busy signal")
 
-    def start_ringing(self):
+    def start_ringing(self, caller_audio=None):
+        # caller_audio is the capture device or .wav file carrying the caller's side of the line.
+        # Without one there is nobody to take a message from, so nothing is recorded
         ring_count = 0
         self.ring_stop_event.clear()
         logger.info("Starting ringer")
         while ring_count < self.max_rings and not self.ring_stop_event.is_set():
+            self.heartbeat("ringer")
             GPIO.output(self.config['ringer_control_pin'], GPIO.HIGH)
             self.update_binary_sensor("ringer_output", "on")
             logger.debug("Ring")
@@ -135,7 +237,9 @@ class PhoneController:
                     GPIO.output(self.config['ringer_control_pin'], GPIO.LOW)
                     self.update_binary_sensor("ringer_output", "off")
                     logger.info("Handset picked up or stop event set, stopping ringer")
+                    self.heartbeat_idle("ringer")
                     return
+                self.heartbeat("ringer")
                 time.sleep(0.1)
             GPIO.output(self.config['ringer_control_pin'], GPIO.LOW)
             self.update_binary_sensor("ringer_output", "off")
@@ -143,9 +247,27 @@ class PhoneController:
             for _ in range(40):  # Loop for 4 seconds with 0.1 second intervals
                 if GPIO.input(self.config['hook_switch_pin']) == GPIO.LOW or self.ring_stop_event.is_set():
                     logger.info("Handset picked up or stop event set, stopping ringer")
+                    self.heartbeat_idle("ringer")
                     return
+                self.heartbeat("ringer")
                 time.sleep(0.1)
+            ring_count += 1
+        self.heartbeat_idle("ringer")
         logger.info("Ringer stopped")
+        if self.voicemail and ring_count >= self.max_rings:
+            if caller_audio:
+                Thread(target=self.take_message, args=(caller_audio,), daemon=True).start()
+            else:
+                logger.info("No answer and no caller audio, not taking a message")
+
+    def ring_with_message(self):
+        # HA-triggered call whose caller speaks through voicemail_caller_input (an intercom capture
+        # device or a .wav file), so an unanswered ring leaves a message
+        caller_audio = self.config.get('voicemail_caller_input')
+        if not self.voicemail or not caller_audio:
+            logger.warning("Ring with message needs enable_voicemail and voicemail_caller_input, ringing without one")
+            caller_audio = None
+        self.start_ringing(caller_audio)
 
     def stop_ringing(self):
         self.ring_stop_event.set()
@@ -155,16 +277,148 @@ class PhoneController:
 
     def handle_dialed_number(self, number):
         action = self.dial_actions.get(number, lambda: self.play_busy_signal())
-        action()
+        outcome = "ok" if number in self.dial_actions else "unmatched"
+        # Hold on to the call so a hang-up while the action runs doesn't lose its result
+        with self.call_lock:
+            call = self.current_call
+            if call is not None:
+                call["pending_actions"] += 1
+        action_start = time.monotonic()
+        try:
+            action()
+        except Exception:
+            outcome = "error"
+            logger.exception(f"Dial action for {number} failed")
+        action_latency = time.monotonic() - action_start
         logger.debug(f"Handled dialed number: {number}")
+        if call is None:
+            return
+        with self.call_lock:
+            call["numbers"].append({
+                "digits": number,
+                "action": number if number in self.dial_actions else None,
+                "action_latency": action_latency,
+                "outcome": outcome
+            })
+            call["pending_actions"] -= 1
+            finished = call["end_time"] is not None and not call["pending_actions"]
+        if finished:
+            self.record_call(call)
+
+    def take_message(self, caller_audio):
+        self.recording_stop_event.clear()
+        logger.info(f"No answer, recording voicemail from {caller_audio}")
+        try:
+            source = open_audio_input(caller_audio)
+            try:
+                self.voicemail.record(source, self.recording_stop_event)
+            finally:
+                source.close()
+        except Exception:
+            logger.exception("Failed to record voicemail")
+        self.publish_voicemail_count()
+
+    def play_messages(self):
+        self.playback_stop_event.clear()
+        Thread(target=self.play_voicemail_messages, daemon=True).start()
+
+    def play_voicemail_messages(self):
+        messages = self.voicemail.messages()
+        if not messages:
+            logger.info("No voicemail messages")
+            self.play_busy_signal()
+            return
+        for message in messages:
+            logger.info(f"Playing voicemail {message['name']}")
+            channel = None
+            # Play back one second at a time, queueing the next chunk while the current one plays
+            for chunk in self.voicemail.iter_chunks(message, chunk_frames=message['sample_rate']):
+                sound = pygame.mixer.Sound(self.voicemail.chunk_to_wav(message, chunk))
+                if channel is None:
+                    channel = sound.play()
+                    continue
+                while channel.get_queue() is not None and not self.playback_stop_event.is_set():
+                    time.sleep(0.05)
+                if self.playback_stop_event.is_set():
+                    break
+                channel.queue(sound)
+            while channel and channel.get_busy() and not self.playback_stop_event.is_set():
+                time.sleep(0.05)
+            if self.playback_stop_event.is_set():
+                if channel:
+                    channel.stop()
+                logger.info("Voicemail playback stopped")
+                break
+            self.voicemail.mark_heard(message)
+            time.sleep(0.5)
+        self.publish_voicemail_count()
+
+    def publish_voicemail_count(self):
+        try:
+            self.ha_client.update_sensor("voicemail_messages", self.voicemail.message_count())
+        except Exception:
+            logger.exception("Failed to publish voicemail count")
+
+    def start_call(self):
+        with self.call_lock:
+            self.current_call = {
+                "off_hook_time": time.time(),
+                "end_time": None,
+                "numbers": [],
+                "pending_actions": 0
+            }
+
+    def end_call(self):
+        with self.call_lock:
+            call, self.current_call = self.current_call, None
+            if call is None:
+                return
+            call["end_time"] = time.time()
+            if call["pending_actions"]:
+                # The dial action still running records the call once it finishes
+                return
+            if self.dialed_number:
+                # Hung up mid-dial, before the dial timeout handled the number
+                call["numbers"].append({"digits": self.dialed_number, "action": None, "action_latency": None, "outcome": "abandoned"})
+        self.record_call(call)
+
+    def record_call(self, call):
+        if self.call_log is None:
+            return
+        try:
+            self.call_log.record_call(call["off_hook_time"], call["end_time"] - call["off_hook_time"], call["numbers"])
+        except Exception:
+            logger.exception("Failed to record call")
+
+    def publish_call_stats(self):
+        while not self.stop_event.is_set():
+            try:
+                for unique_id, value in self.call_log.rollups().items():
+                    self.ha_client.update_sensor(unique_id, value)
+                logger.debug("Published call stats")
+            except Exception:
+                logger.exception("Failed to publish call stats")
+            self.stop_event.wait(self.config.get('call_stats_interval', 300))
 
     def cleanup(self):
+        if self.watchdog:
+            self.watchdog.stop()
         self.stop_event.set()
         self.ring_stop_event.set()
+        self.recording_stop_event.set()
+        self.playback_stop_event.set()
         self.stop_all_sounds()
         GPIO.cleanup()
         logger.info("Cleaned up GPIO and stopped all sounds")
 
+    def heartbeat(self, name):
+        if self.watchdog:
+            self.watchdog.heartbeat(name)
+
+    def heartbeat_idle(self, name):
+        if self.watchdog:
+            self.watchdog.idle(name)
+
     def update_binary_sensor(self, unique_id, state):
         binary_sensor = getattr(self.ha_client, f"{unique_id}_entity", None)
         if binary_sensor and self.sensor_states.get(unique_id) != state:
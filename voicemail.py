@@ -0,0 +1,189 @@
+import gzip
+import io
+import json
+import os
+import sys
+import time
+import wave
+import logging
+from array import array
+from functools import cache
+
+logger = logging.getLogger(__name__)
+
+# G.711 mu-law: 16-bit samples stored as 8-bit log-companded codes, half the size of raw PCM
+MULAW_BIAS = 0x84
+MULAW_CLIP = 32635
+
+def mulaw_encode_sample(sample):
+    sign = 0x80 if sample < 0 else 0
+    magnitude = min(abs(sample), MULAW_CLIP) + MULAW_BIAS
+    exponent = max(0, magnitude.bit_length() - 8)
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return ~(sign | exponent << 4 | mantissa) & 0xFF
+
+def mulaw_decode_sample(code):
+    code = ~code & 0xFF
+    exponent = (code >> 4) & 0x07
+    magnitude = ((((code & 0x0F) << 3) + MULAW_BIAS) << exponent) - MULAW_BIAS
+    return -magnitude if code & 0x80 else magnitude
+
+@cache
+def mulaw_encode_table():
+    # Indexed by the sample's unsigned 16-bit value; built on first use so startup doesn't pay for it
+    return bytes(mulaw_encode_sample(value - 65536 if value >= 32768 else value) for value in range(65536))
+
+MULAW_DECODE = [mulaw_decode_sample(code) for code in range(256)]
+
+def pcm_samples(chunk):
+    samples = array('h', chunk[:len(chunk) - len(chunk) % 2])
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples
+
+def mulaw_encode(chunk):
+    table = mulaw_encode_table()
+    return bytes(table[sample & 0xFFFF] for sample in pcm_samples(chunk))
+
+def mulaw_decode(data):
+    samples = array('h', (MULAW_DECODE[code] for code in data))
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples.tobytes()
+
+class Voicemail:
+    def __init__(self, directory, quota_bytes, max_message_seconds=120, chunk_frames=1600,
+                 silence_seconds=5.0, silence_level=-45.0):
+        self.directory = directory
+        self.quota_bytes = quota_bytes
+        self.max_message_seconds = max_message_seconds
+        self.chunk_frames = chunk_frames
+        self.silence_seconds = silence_seconds
+        # Mean square of a 16-bit sample at silence_level dBFS
+        self.silence_power = (10 ** (silence_level / 10)) * (32768 ** 2)
+        os.makedirs(directory, exist_ok=True)
+
+    def messages(self):
+        messages = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith('.json'):
+                with open(os.path.join(self.directory, name), 'r') as info_file:
+                    messages.append(json.load(info_file))
+        return messages
+
+    def message_count(self):
+        return sum(1 for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def has_new_messages(self):
+        return any(message['new'] for message in self.messages())
+
+    def usage(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def make_room(self):
+        # Oldest heard messages give way first; unheard ones are never dropped
+        used = self.usage()
+        for message in self.messages():
+            if used < self.quota_bytes:
+                break
+            if not message['new']:
+                self.delete(message)
+                used = self.usage()
+        return used
+
+    def record(self, source, stop_event):
+        used = self.make_room()
+        if used >= self.quota_bytes:
+            logger.warning(f"Voicemail box {self.directory} is full ({used} bytes), not recording")
+            return None
+
+        now = time.time()
+        name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}"
+        # Only 16-bit audio can be mu-law coded; anything else is kept as it came in
+        codec = "mulaw" if source.sample_width == 2 else "pcm"
+        audio_path = os.path.join(self.directory, f"{name}.{'ulaw' if codec == 'mulaw' else 'pcm'}.gz")
+        max_frames = int(self.max_message_seconds * source.sample_rate)
+        max_silent_frames = int(self.silence_seconds * source.sample_rate)
+        frames = silent_frames = 0
+        heard_voice = False
+        # Audio is coded and streamed through gzip one chunk at a time, so memory stays flat however long the message runs
+        with open(audio_path, 'wb') as raw_file, gzip.GzipFile(fileobj=raw_file, mode='wb', compresslevel=6) as audio_file:
+            while frames < max_frames and not stop_event.is_set():
+                chunk = source.read(min(self.chunk_frames, max_frames - frames))
+                if not chunk:
+                    break
+                audio_file.write(mulaw_encode(chunk) if codec == "mulaw" else chunk)
+                chunk_frames = len(chunk) // (source.channels * source.sample_width)
+                frames += chunk_frames
+                if used + raw_file.tell() >= self.quota_bytes:
+                    logger.warning(f"Voicemail box {self.directory} reached its quota, ending message")
+                    break
+                if self.is_silent(chunk, source.sample_width):
+                    silent_frames += chunk_frames
+                    if silent_frames >= max_silent_frames:
+                        logger.info(f"Caller silent for {self.silence_seconds}s, ending message")
+                        break
+                else:
+                    silent_frames = 0
+                    heard_voice = True
+
+        if not heard_voice:
+            os.remove(audio_path)
+            logger.info("Nothing but silence, discarding message")
+            return None
+
+        message = {
+            "name": name,
+            "audio_file": os.path.basename(audio_path),
+            "created": now,
+            "duration": frames / source.sample_rate,
+            "sample_rate": source.sample_rate,
+            "channels": source.channels,
+            "sample_width": source.sample_width,
+            "codec": codec,
+            "new": True
+        }
+        self.write_info(message)
+        logger.info(f"Recorded voicemail {name} ({message['duration']:.1f}s)")
+        return message
+
+    def is_silent(self, chunk, sample_width):
+        # Only 16-bit audio is level-checked; anything else always counts as voice
+        if sample_width != 2 or len(chunk) < 2:
+            return False
+        samples = pcm_samples(chunk)
+        return sum(sample * sample for sample in samples) < self.silence_power * len(samples)
+
+    def iter_chunks(self, message, chunk_frames=None):
+        # Yields PCM at the message's sample_width, whatever codec it was stored with
+        mulaw = message.get('codec', 'pcm') == 'mulaw'
+        frame_size = message['channels'] * (1 if mulaw else message['sample_width'])
+        chunk_size = (chunk_frames or self.chunk_frames) * frame_size
+        with gzip.open(os.path.join(self.directory, message['audio_file']), 'rb') as audio_file:
+            while (chunk := audio_file.read(chunk_size)):
+                yield mulaw_decode(chunk) if mulaw else chunk
+
+    def chunk_to_wav(self, message, chunk):
+        wav_buffer = io.BytesIO()
+        with wave.open(wav_buffer, 'wb') as wav_file:
+            wav_file.setnchannels(message['channels'])
+            wav_file.setsampwidth(message['sample_width'])
+            wav_file.setframerate(message['sample_rate'])
+            wav_file.writeframes(chunk)
+        wav_buffer.seek(0)
+        return wav_buffer
+
+    def mark_heard(self, message):
+        message['new'] = False
+        self.write_info(message)
+
+    def delete(self, message):
+        os.remove(os.path.join(self.directory, message['audio_file']))
+        os.remove(os.path.join(self.directory, f"{message['name']}.json"))
+        logger.info(f"Deleted voicemail {message['name']}")
+
+    def write_info(self, message):
+        info_path = os.path.join(self.directory, f"{message['name']}.json")
+        with open(f"{info_path}.tmp", 'w') as info_file:
+            json.dump(message, info_file)
+        os.replace(f"{info_path}.tmp", info_path)
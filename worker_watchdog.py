@@ -0,0 +1,161 @@
+import sys
+import time
+import traceback
+import logging
+from logging.handlers import RotatingFileHandler
+from threading import Thread, Event, current_thread, enumerate as enumerate_threads, get_ident
+
+logger = logging.getLogger(__name__)
+
+class WorkerSuperseded(Exception):
+    pass
+
+class Watchdog:
+    def __init__(self, ha_client, diagnostics_path, deadline=0.25, check_interval=0.05, restart_after=None,
+                 sample_count=5, sample_interval=0.05, max_bytes=1024 * 1024, backup_count=3):
+        self.ha_client = ha_client
+        self.diagnostics_path = diagnostics_path
+        self.deadline = deadline
+        self.check_interval = check_interval
+        self.restart_after = restart_after
+        self.sample_count = sample_count
+        self.sample_interval = sample_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.workers = {}
+        # Heartbeats are plain dict stores so workers pay next to nothing per beat
+        self.beats = {}
+        self.beat_threads = {}
+        self.stalled = {}
+        self.stop_event = Event()
+        self.diagnostics = logging.getLogger(f"{__name__}.diagnostics")
+        self.diagnostics.propagate = False
+
+    def add_worker(self, name, target, restart=False, daemon=False):
+        self.workers[name] = {"target": target, "restart": restart, "daemon": daemon, "thread": None}
+        self.start_worker(name)
+
+    def start_worker(self, name):
+        worker = self.workers[name]
+        thread = Thread(target=self.run_worker, args=(name, worker["target"]), name=name, daemon=worker["daemon"])
+        worker["thread"] = thread
+        self.beats[name] = time.monotonic()
+        thread.start()
+
+    def run_worker(self, name, target):
+        try:
+            target()
+        except WorkerSuperseded:
+            logger.info(f"Worker {name} unblocked after being replaced, exiting")
+            return
+        except Exception:
+            logger.exception(f"Worker {name} crashed")
+            self.diagnostics.info(f"Worker {name} crashed\n{traceback.format_exc().rstrip()}")
+        else:
+            if not self.stop_event.is_set():
+                logger.error(f"Worker {name} exited without being stopped")
+                self.diagnostics.info(f"Worker {name} exited without being stopped")
+        if self.workers[name]["thread"] is current_thread() and self.stop_event.is_set():
+            self.beats.pop(name, None)
+        # Otherwise the last beat stays, so the monitor flags the dead worker as stalled and keeps it flagged
+
+    def heartbeat(self, name):
+        worker = self.workers.get(name)
+        if worker and worker["thread"] is not current_thread():
+            raise WorkerSuperseded(name)
+        self.beats[name] = time.monotonic()
+        self.beat_threads[name] = get_ident()
+
+    def idle(self, name):
+        # Stops watching a task that only runs now and then, like the ringer
+        self.beats.pop(name, None)
+
+    def start(self):
+        handler = RotatingFileHandler(self.diagnostics_path, maxBytes=self.max_bytes, backupCount=self.backup_count)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        self.diagnostics.addHandler(handler)
+        self.diagnostics.setLevel(logging.INFO)
+        Thread(target=self.monitor, name="watchdog", daemon=True).start()
+        logger.info(f"Watchdog started with a {self.deadline * 1000:.0f}ms deadline")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join_workers(self):
+        # Restarted workers replace their thread, so keep joining until each name's current thread is done
+        for name, worker in self.workers.items():
+            while True:
+                thread = worker["thread"]
+                thread.join()
+                if worker["thread"] is thread:
+                    break
+
+    def monitor(self):
+        while not self.stop_event.wait(self.check_interval):
+            now = time.monotonic()
+            for name, beat in list(self.beats.items()):
+                late = now - beat
+                if late > self.deadline and name not in self.stalled:
+                    self.report_stall(name, beat, now)
+                elif late <= self.deadline and name in self.stalled:
+                    self.report_recovery(name, now)
+                elif name in self.stalled and self.should_restart(name, now):
+                    self.restart_worker(name)
+            for name in list(self.stalled):
+                if name not in self.beats:
+                    self.report_recovery(name, now)
+            for name, worker in self.workers.items():
+                if worker["restart"] and not worker["thread"].is_alive() and not self.stop_event.is_set():
+                    logger.error(f"Worker {name} exited unexpectedly, restarting")
+                    self.start_worker(name)
+
+    def should_restart(self, name, now):
+        worker = self.workers.get(name)
+        return (worker is not None and worker["restart"] and self.restart_after is not None
+                and now - self.stalled[name] >= self.restart_after)
+
+    def restart_worker(self, name):
+        logger.error(f"Worker {name} still stalled after {self.restart_after}s, starting a replacement")
+        self.diagnostics.info(f"Restarting stalled worker {name}")
+        del self.stalled[name]
+        self.start_worker(name)
+        self.publish_stalled()
+
+    def report_stall(self, name, beat, now):
+        late = now - beat
+        self.stalled[name] = beat + self.deadline
+        worker = self.workers.get(name)
+        state = "stalled" if worker is None or worker["thread"].is_alive() else "dead"
+        logger.warning(f"Worker {name} {state}: no heartbeat for {late * 1000:.0f}ms")
+        self.publish_stalled()
+        self.diagnostics.info(f"Worker {name} {state}: no heartbeat for {late * 1000:.0f}ms\n{self.sample_stacks(name)}")
+
+    def report_recovery(self, name, now):
+        stalled_for = now - self.stalled.pop(name)
+        logger.warning(f"Worker {name} recovered after stalling for {stalled_for * 1000:.0f}ms")
+        self.diagnostics.info(f"Worker {name} recovered after {stalled_for * 1000:.0f}ms")
+        self.publish_stalled()
+
+    def sample_stacks(self, name):
+        stalled_ident = self.beat_threads.get(name)
+        thread_names = {thread.ident: thread.name for thread in enumerate_threads()}
+        samples = []
+        start = time.monotonic()
+        for sample in range(self.sample_count):
+            if sample:
+                time.sleep(self.sample_interval)
+            lines = [f"--- Sample {sample + 1}/{self.sample_count} at +{(time.monotonic() - start) * 1000:.0f}ms ---"]
+            for ident, frame in sys._current_frames().items():
+                if ident == get_ident():
+                    continue
+                marker = "  <-- stalled" if ident == stalled_ident else ""
+                lines.append(f"Thread {thread_names.get(ident, ident)}{marker}")
+                lines.append("".join(traceback.format_stack(frame)).rstrip())
+            samples.append("\n".join(lines))
+        return "\n".join(samples)
+
+    def publish_stalled(self):
+        try:
+            self.ha_client.update_binary_sensor("worker_stalled", bool(self.stalled))
+        except Exception:
+            logger.exception("Failed to publish watchdog state")